@@ -4,16 +4,39 @@ Note: Do not print to stdout before/while the MCP stdio transport is active.
 We write startup messages to stderr to avoid corrupting the protocol stream.
 """
 
+import logging
+import os
 import sys
 from root_mcp_server.server import server
 
 
+def _configure_logging():
+    """Send the root_mcp logger to stderr, at the level named by ROOT_MCP_LOG_LEVEL (default INFO).
+
+    DEBUG adds the executed code listing and captured output to the log.
+    """
+    log = logging.getLogger("root_mcp")
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    log.addHandler(handler)
+    log.propagate = False
+    try:
+        log.setLevel(os.environ.get("ROOT_MCP_LOG_LEVEL", "INFO").upper())
+    except ValueError:
+        log.setLevel(logging.INFO)
+    return log
+
+
 def main():
     """Start the MCP server in stdio mode for the agent to call tools.
 
     This script is the console entrypoint (console_scripts) installed by the package.
     """
-    print("Starting root-mcp server (stdio)...", file=sys.stderr)
+    log = _configure_logging()
+    log.info("Starting root-mcp server (stdio)...")
+    # run_cpp points fd 1 at a capture pipe while it runs; give the stdio transport its own
+    # duplicate of fd 1 so responses and notifications sent meanwhile are never captured
+    sys.stdout = open(os.dup(sys.stdout.fileno()), "w", encoding="utf-8", closefd=True)
     server.run(transport="stdio")
 
 
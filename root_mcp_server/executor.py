@@ -4,19 +4,157 @@
 # ROOT module has dynamic attributes that pylint cannot detect
 
 import io
+import codecs
+import re
+import select
 import sys
 import os
-import tempfile
+import threading
+import time
 import contextlib
 import traceback
-from typing import Any, Dict, Optional
-from dataclasses import asdict, dataclass
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from dataclasses import dataclass
 
 try:
     import ROOT  # type: ignore
 except ImportError:
     ROOT = None  # type: ignore
 
+# Sources above this size are compiled without caching to bound the cache's memory
+_COMPILE_CACHE_MAX_SOURCE = 100_000
+
+
+@lru_cache(maxsize=256)
+def _compile_cached(source: str):
+    return compile(source, "<root_mcp>", "exec")
+
+
+def _compile(source: str):
+    """Compile user code, reusing the code object for snippets that were sent before."""
+    if len(source) > _COMPILE_CACHE_MAX_SOURCE:
+        return compile(source, "<root_mcp>", "exec")
+    return _compile_cached(source)
+
+
+# Leading tokens that mark a single-line snippet as a declaration rather than a statement
+_DECL_PREFIXES = (
+    "class ",
+    "struct ",
+    "namespace ",
+    "template",
+    "#include",
+    "void ",
+    "int ",
+    "double ",
+    "auto ",
+    "inline ",
+    "static ",
+)
+
+
+def _is_declaration(code: str) -> bool:
+    """Cheap lexical guess at whether ``code`` should go to Declare rather than ProcessLine.
+
+    Multi-line snippets keep going to Declare first, as before; only single-line
+    statements such as ``std::cout << ...`` skip straight to ProcessLine.
+    """
+    stripped = code.strip()
+    return "\n" in stripped or stripped.startswith(_DECL_PREFIXES)
+
+
+# Receives captured stdout text as it is produced
+_OutputCallback = Callable[[str], None]
+
+# Error markers cling writes to stderr; "[Ee]rror:" also covers "fatal error:"
+_STDERR_ERROR_RE = re.compile(rb"[Ee]rror:")
+
+
+def _close_quietly(fd: int) -> None:
+    try:
+        os.close(fd)
+    except OSError:
+        pass
+
+
+# How long run_cpp waits for EOF on the capture pipes after restoring fds 1/2
+_DRAIN_TIMEOUT = 1.0
+# How often a drainer wakes up to check whether it was told to stop, in milliseconds
+_DRAIN_POLL_MS = 100
+
+
+def _drain(fd: int, buf: bytearray, stop: threading.Event, on_output: Optional[_OutputCallback] = None) -> None:
+    """Read ``fd`` into ``buf`` until EOF or until ``stop`` is set, then close it.
+
+    If ``on_output`` is given, each chunk is also decoded and passed to it as it arrives.
+    """
+    poller = select.poll()
+    poller.register(fd, select.POLLIN)
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    try:
+        while not stop.is_set():
+            if not poller.poll(_DRAIN_POLL_MS):
+                continue
+            chunk = os.read(fd, 65536)
+            if not chunk:
+                break
+            buf.extend(chunk)
+            if on_output is not None:
+                try:
+                    text = decoder.decode(chunk)
+                    if text:
+                        on_output(text)
+                except Exception:
+                    on_output = None  # Stop streaming, but keep draining so writers never block
+    finally:
+        os.close(fd)
+
+
+def _start_drainer(
+    fd: int, buf: bytearray, stop: threading.Event, on_output: Optional[_OutputCallback] = None
+) -> threading.Thread:
+    """Start a background thread draining a capture pipe so writers never block on a full pipe."""
+    thread = threading.Thread(target=_drain, args=(fd, buf, stop, on_output), name="root-mcp-drain", daemon=True)
+    thread.start()
+    return thread
+
+
+def _preloaded_modules() -> Dict[str, Any]:
+    """Import optional numeric modules to pre-bind in user code (``np``, ``numba``) if installed."""
+    modules: Dict[str, Any] = {}
+    try:
+        import numpy  # type: ignore  # pylint: disable=import-outside-toplevel
+
+        modules["np"] = numpy
+    except ImportError:
+        pass
+    try:
+        import numba  # type: ignore  # pylint: disable=import-outside-toplevel
+
+        modules["numba"] = numba
+    except ImportError:
+        pass
+    return modules
+
+
+class _OutputTee(io.TextIOBase):
+    """Text stream that writes to a capture buffer and forwards each write to a callback."""
+
+    def __init__(self, buf: io.TextIOBase, on_output: _OutputCallback):
+        super().__init__()
+        self._buf = buf
+        self._on_output = on_output
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, s: str) -> int:
+        self._buf.write(s)
+        if s:
+            self._on_output(s)
+        return len(s)
+
 
 @dataclass
 class ExecutionResult:
@@ -29,6 +167,17 @@ class ExecutionResult:
     error_type: Optional[str] = None
     timed_out: bool = False
 
+    def as_dict(self) -> Dict[str, Any]:
+        """Return the result as a plain dict (fields are flat, so no deep copy is needed)."""
+        return {
+            "ok": self.ok,
+            "stdout": self.stdout,
+            "stderr": self.stderr,
+            "error": self.error,
+            "error_type": self.error_type,
+            "timed_out": self.timed_out,
+        }
+
 
 class RootExecutor:
     """Executes Python and C++ code using PyROOT in-process."""
@@ -46,22 +195,84 @@ class RootExecutor:
         ROOT.gROOT.SetBatch(not enable_graphics)  # type: ignore
 
         # Enable implicit multi-threading if available (for better performance)
-        try:
-            if hasattr(ROOT, "EnableImplicitMT"):
-                ROOT.EnableImplicitMT()  # type: ignore
-        except Exception:
-            pass  # Not all ROOT builds have MT support
+        enable_mt = getattr(ROOT, "EnableImplicitMT", None)
+        if enable_mt is not None:
+            try:
+                enable_mt()
+            except Exception:
+                pass  # Not all ROOT builds have MT support
 
         # Keep recent execution globals to prevent Python GC from destroying ROOT objects
-        self.globals_dict = {"ROOT": ROOT, "__name__": "__root_mcp__"}
-
-    def run_python(self, code: str) -> Dict[str, Any]:
-        """Execute Python code with ROOT available in scope."""
-        out_buf, err_buf = io.StringIO(), io.StringIO()
+        # NumPy/Numba are pre-bound so snippets can @numba.njit hot loops without importing them
+        self.globals_dict = {"__name__": "__root_mcp__", **_preloaded_modules(), "ROOT": ROOT}
+
+        # Real stdout/stderr fds, saved once and restored after every C++ capture
+        self._saved_fds = (os.dup(1), os.dup(2))
+        # cling is not reentrant; serialize access to it and to the fd swap
+        self._lock = threading.Lock()
+        # Per-thread capture buffers, reused across calls
+        self._tls = threading.local()
+
+    def _buffers(self):
+        """Return this thread's (stdout, stderr) capture buffers, emptied for a new call."""
+        tls = self._tls
+        if not hasattr(tls, "out"):
+            tls.out, tls.err = io.StringIO(), io.StringIO()
+        for buf in (tls.out, tls.err):
+            buf.seek(0)
+            buf.truncate()
+        return tls.out, tls.err
+
+    def _byte_buffers(self):
+        """Return this thread's byte-backed (stdout, stderr) text streams, emptied for a new call."""
+        tls = self._tls
+        if not hasattr(tls, "bout"):
+            tls.bout, tls.berr = (
+                io.TextIOWrapper(io.BytesIO(), encoding="utf-8", errors="replace", newline="", write_through=True)
+                for _ in range(2)
+            )
+        for stream in (tls.bout, tls.berr):
+            stream.seek(0)
+            stream.truncate()
+        return tls.bout, tls.berr
+
+    def _redirect_to_pipes(self) -> Tuple[int, int]:
+        """Point fds 1 and 2 at fresh pipes and return their read ends."""
+        opened: List[int] = []
+        try:
+            r_out, w_out = os.pipe()
+            opened += (r_out, w_out)
+            r_err, w_err = os.pipe()
+            opened += (r_err, w_err)
+            os.dup2(w_out, 1)
+            os.dup2(w_err, 2)
+        except OSError:
+            self._restore_fds()
+            for fd in opened:
+                _close_quietly(fd)
+            raise
+        # fds 1/2 now hold the only write ends the drainers wait on
+        os.close(w_out)
+        os.close(w_err)
+        return r_out, r_err
+
+    def _restore_fds(self) -> None:
+        """Point fds 1 and 2 back at the real stdout/stderr."""
+        os.dup2(self._saved_fds[0], 1)
+        os.dup2(self._saved_fds[1], 2)
+
+    def run_python(self, code: str, on_output: Optional[_OutputCallback] = None) -> Dict[str, Any]:
+        """Execute Python code with ROOT available in scope.
+
+        All calls share ``self.globals_dict``, so names defined by one call stay available to the next.
+        ``on_output``, if given, is called with each stdout chunk as it is written.
+        """
+        out_buf, err_buf = self._buffers()
+        out_stream = _OutputTee(out_buf, on_output) if on_output is not None else out_buf
 
         try:
-            with contextlib.redirect_stdout(out_buf), contextlib.redirect_stderr(err_buf):
-                exec(code, self.globals_dict)  # pylint: disable=exec-used
+            with contextlib.redirect_stdout(out_stream), contextlib.redirect_stderr(err_buf):
+                exec(_compile(code), self.globals_dict)  # pylint: disable=exec-used
 
             stderr = err_buf.getvalue()
 
@@ -75,8 +286,7 @@ class RootExecutor:
             )
 
         except Exception as e:  # pylint: disable=broad-except
-            with contextlib.redirect_stdout(out_buf), contextlib.redirect_stderr(err_buf):
-                traceback.print_exc()
+            traceback.print_exc(file=err_buf)
             result = ExecutionResult(
                 ok=False,
                 stdout=out_buf.getvalue(),
@@ -84,136 +294,109 @@ class RootExecutor:
                 error=str(e),
                 error_type=type(e).__name__,
             )
-        return asdict(result)
+        return result.as_dict()
 
-    def run_cpp(self, code: str) -> Dict[str, Any]:
-        """Execute C++ code via ROOT's cling interpreter."""
-        # Capture both Python and process-level stdout/stderr to avoid corrupting MCP stdio
-        py_out, py_err = io.StringIO(), io.StringIO()
-        tmp_out_fd, tmp_out_path = tempfile.mkstemp()
-        tmp_err_fd, tmp_err_path = tempfile.mkstemp()
-
-        # Save real stdout/stderr fds
-        saved_stdout_fd = os.dup(1)
-        saved_stderr_fd = os.dup(2)
+    def run_cpp(self, code: str, on_output: Optional[_OutputCallback] = None) -> Dict[str, Any]:
+        """Execute C++ code via ROOT's cling interpreter.
 
-        try:
-            # Redirect OS-level fds 1 and 2 to our temp files
-            os.dup2(tmp_out_fd, 1)
-            os.dup2(tmp_err_fd, 2)
+        ``on_output``, if given, is called with each stdout chunk (Python- or process-level) as it arrives.
+        Whatever it does must not write to fd 1, which points at the capture pipe during the call.
+        """
+        # Capture both Python and process-level stdout/stderr to avoid corrupting MCP stdio
+        py_out, py_err = self._byte_buffers()
+        py_out_stream = _OutputTee(py_out, on_output) if on_output is not None else py_out
+        out_bytes, err_bytes = bytearray(), bytearray()
+        failure: Optional[Exception] = None
+        ret_code = None
+
+        # cling and the process-wide fds 1/2 are shared state, so only one call may swap them at a time
+        with self._lock:
+            # Redirect OS-level fds 1 and 2 into pipes drained by background threads
+            r_out, r_err = self._redirect_to_pipes()
+            stop_draining = threading.Event()
+            drainers = [
+                _start_drainer(r_out, out_bytes, stop_draining, on_output),
+                _start_drainer(r_err, err_bytes, stop_draining),
+            ]
 
-            with contextlib.redirect_stdout(py_out), contextlib.redirect_stderr(py_err):
-                # ProcessLine returns 0 on success, non-zero on error
-                ret_code = None
+            try:
+                with contextlib.redirect_stdout(py_out_stream), contextlib.redirect_stderr(py_err):
+                    # ProcessLine returns 0 on success, non-zero on error
+                    if _is_declaration(code):
+                        try:
+                            # Declarations (and multi-line code) go to Declare
+                            ROOT.gInterpreter.Declare(code)  # type: ignore
+                            ret_code = 0  # Declare doesn't return a value, assume success if no exception
+                        except Exception:
+                            # Fall back to ProcessLine which returns error code
+                            ret_code = ROOT.gInterpreter.ProcessLine(code)  # type: ignore
+                    else:
+                        # Single-line statements skip the Declare attempt
+                        ret_code = ROOT.gInterpreter.ProcessLine(code)  # type: ignore
+
+                # Attempt to flush Python-level buffers
                 try:
-                    # Try Declare first (for multi-line declarations)
-                    ROOT.gInterpreter.Declare(code)  # type: ignore
-                    ret_code = 0  # Declare doesn't return a value, assume success if no exception
+                    sys.stdout.flush()
+                    sys.stderr.flush()
                 except Exception:
-                    # Fall back to ProcessLine which returns error code
-                    ret_code = ROOT.gInterpreter.ProcessLine(code)  # type: ignore
-
-            # Attempt to flush Python-level buffers
-            try:
-                sys.stdout.flush()
-                sys.stderr.flush()
-            except Exception:
-                pass
-
-            # Restore original fds before reading files (to not block server stdio)
-            os.dup2(saved_stdout_fd, 1)
-            os.dup2(saved_stderr_fd, 2)
-
-            # Close temp fds before reading
-            try:
-                os.close(tmp_out_fd)
-            except Exception:
-                pass
-            try:
-                os.close(tmp_err_fd)
-            except Exception:
-                pass
-
-            # Read captured OS-level outputs
-            with open(tmp_out_path, "r", encoding="utf-8", errors="replace") as f:
-                os_out = f.read()
-            with open(tmp_err_path, "r", encoding="utf-8", errors="replace") as f:
-                os_err = f.read()
-
-            # Combine outputs
-            combined_stdout = (py_out.getvalue() or "") + (os_out or "")
-            combined_stderr = (py_err.getvalue() or "") + (os_err or "")
-
-            # Check for errors: ret_code != 0 OR stderr contains error keywords
-            error_keywords = ["error:", "Error:", "fatal error:"]
-            has_stderr_error = any(keyword in combined_stderr for keyword in error_keywords)
-
-            if ret_code != 0 or has_stderr_error:
-                error_msg = (
-                    f"C++ execution failed (return code: {ret_code})"
-                    if ret_code != 0
-                    else "C++ compilation error detected"
-                )
-                result = ExecutionResult(
-                    ok=False,
-                    stdout=combined_stdout,
-                    stderr=combined_stderr,
-                    error=error_msg,
-                    error_type="ClingError",
-                )
-            else:
-                # Check if any canvases were created and add HTTP URL info
-                stdout = combined_stdout
-
-                result = ExecutionResult(
-                    ok=True,
-                    stdout=stdout,
-                    stderr=combined_stderr,
-                )
-        except Exception as e:
-            # Ensure fds are restored on error
-            try:
-                os.dup2(saved_stdout_fd, 1)
-                os.dup2(saved_stderr_fd, 2)
-            except Exception:
-                pass
+                    pass
+            except Exception as e:
+                failure = e
+                traceback.print_exc(file=py_err)
+            finally:
+                # Restoring the saved fds drops our write ends, so the drainers normally see EOF
+                self._restore_fds()
+                # Child processes started by the snippet (gSystem->Exec("cmd &"), a browser for web
+                # graphics, ...) inherit fds 1/2 and keep the pipes open, so EOF may never come.
+                # Wait briefly, then stop the drainers and keep what they captured.
+                deadline = time.monotonic() + _DRAIN_TIMEOUT
+                for drainer in drainers:
+                    drainer.join(max(0.0, deadline - time.monotonic()))
+                stop_draining.set()
+                for drainer in drainers:
+                    drainer.join()
+
+        # Combine outputs: put the Python-level bytes in front of the pipe bytes
+        for stream, captured in ((py_out, out_bytes), (py_err, err_bytes)):
+            stream.flush()
+            with stream.buffer.getbuffer() as view:
+                captured[:0] = view
+
+        # Scan the raw stderr bytes for error keywords in one pass, then decode each stream once
+        has_stderr_error = _STDERR_ERROR_RE.search(err_bytes) is not None
+        combined_stdout = out_bytes.decode("utf-8", "replace")
+        combined_stderr = err_bytes.decode("utf-8", "replace")
+
+        if failure is not None:
+            result = ExecutionResult(
+                ok=False,
+                stdout=combined_stdout,
+                stderr=combined_stderr,
+                error=str(failure),
+                error_type=type(failure).__name__,
+            )
+            return result.as_dict()
 
-            with contextlib.redirect_stdout(py_out), contextlib.redirect_stderr(py_err):
-                traceback.print_exc()
+        # Check for errors: ret_code != 0 OR stderr contains error keywords
+        if ret_code != 0 or has_stderr_error:
+            error_msg = (
+                f"C++ execution failed (return code: {ret_code})" if ret_code != 0 else "C++ compilation error detected"
+            )
             result = ExecutionResult(
                 ok=False,
-                stdout=py_out.getvalue(),
-                stderr=py_err.getvalue(),
-                error=str(e),
-                error_type=type(e).__name__,
+                stdout=combined_stdout,
+                stderr=combined_stderr,
+                error=error_msg,
+                error_type="ClingError",
+            )
+        else:
+            # Check if any canvases were created and add HTTP URL info
+            stdout = combined_stdout
+
+            result = ExecutionResult(
+                ok=True,
+                stdout=stdout,
+                stderr=combined_stderr,
             )
-        finally:
-            # Close saved fds
-            try:
-                os.close(saved_stdout_fd)
-            except Exception:
-                pass
-            try:
-                os.close(saved_stderr_fd)
-            except Exception:
-                pass
-            # Ensure temp fds are closed if not already
-            try:
-                os.close(tmp_out_fd)
-            except Exception:
-                pass
-            try:
-                os.close(tmp_err_fd)
-            except Exception:
-                pass
-            # Clean up temp files
-            try:
-                os.unlink(tmp_out_path)
-            except Exception:
-                pass
-            try:
-                os.unlink(tmp_err_path)
-            except Exception:
-                pass
 
-        return asdict(result)
+        return result.as_dict()
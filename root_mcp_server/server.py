@@ -4,88 +4,155 @@ This module exposes a FastMCP server object with two tools:
 - root_python(code: str)
 - root_cpp(code: str)
 
-Both tools execute code in-process using PyROOT (via RootExecutor).
+Both tools execute code in-process using PyROOT (via RootExecutor). Captured
+stdout is forwarded to the client as MCP log notifications while the code runs;
+the complete result is returned when execution finishes. Streaming root_cpp
+output relies on the stdio transport not writing to fd 1 (cli.py gives it its
+own duplicate), since run_cpp points fd 1 at a capture pipe during the call.
+
+All executor calls run on a single dedicated worker thread: cling and most
+PyROOT state is process-global and not thread-safe. Parallelism inside ROOT
+comes from ``ROOT.EnableImplicitMT()``, not from extra worker threads.
 """
 
 import asyncio
-import sys
+import atexit
+import concurrent.futures
+import logging
+from typing import Any, Callable, Dict, Optional
 from mcp.server import FastMCP
+from mcp.server.fastmcp import Context
 from root_mcp_server.executor import RootExecutor
 
+log = logging.getLogger("root_mcp")
 
-# Initialize executor with graphics enabled to keep ROOT objects alive
-executor = RootExecutor(enable_graphics=True)
+# Executor (graphics enabled to keep ROOT objects alive), created on first tool call so
+# ROOT initialization does not delay the MCP handshake
+_executor: Optional[RootExecutor] = None
+
+
+def _get_executor() -> RootExecutor:
+    """Return the shared executor, creating it on first use (on the ROOT worker thread)."""
+    global _executor  # pylint: disable=global-statement
+    if _executor is None:
+        _executor = RootExecutor(enable_graphics=True)
+    return _executor
+
+
+# Single persistent worker thread so ROOT always sees the same caller thread
+_root_pool = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="root-exec")
+atexit.register(_root_pool.shutdown, wait=False)
 
 # Create FastMCP server
 server = FastMCP(name="root-mcp")
 
 
-@server.tool(name="root_python", description="Execute Python code with PyROOT available in scope.")
-async def root_python(code: str):
+def _log_code(title: str, code: str) -> None:
+    """Log the code listing, with line numbers, before execution (DEBUG only)."""
+    if not log.isEnabledFor(logging.DEBUG):
+        return
+    listing = "".join(f"{i:3d} | {line}\n" for i, line in enumerate(code.split("\n"), 1))
+    log.debug("\n%s\n%s:\n%s%s", "=" * 60, title, listing, "=" * 60)
+
+
+def _log_result(result: Dict[str, Any]) -> None:
+    """Log the execution status (INFO) and the captured output (DEBUG) after execution."""
+    if result.get("ok"):
+        log.info("✓ EXECUTION SUCCESS")
+    else:
+        log.info("❌ EXECUTION FAILED\nError: %s\nType: %s", result.get("error"), result.get("error_type"))
+    if not log.isEnabledFor(logging.DEBUG):
+        return
+    parts = []
+    if result.get("stdout"):
+        parts.append(f"STDOUT:\n{result.get('stdout')}\n")
+    if result.get("stderr"):
+        parts.append(f"STDERR:\n{result.get('stderr')}\n")
+    if parts:
+        log.debug("%s", "".join(parts))
+
+
+async def _run_streaming(ctx: Context, method: Callable[..., Dict[str, Any]], code: str) -> Dict[str, Any]:
+    """Run an executor method on the ROOT worker thread, streaming stdout to the client.
+
+    Output chunks are handed from the worker (and pipe drainer) threads to the event loop
+    through a queue and sent as ``stdout`` log messages; a ``None`` sentinel marks the end.
+    """
+    loop = asyncio.get_running_loop()
+    chunks: asyncio.Queue = asyncio.Queue()
+
+    def put(item: Optional[str]) -> None:
+        try:
+            loop.call_soon_threadsafe(chunks.put_nowait, item)
+        except RuntimeError:
+            pass  # Event loop already closed
+
+    def job() -> Dict[str, Any]:
+        try:
+            return method(_get_executor(), code, on_output=put)
+        finally:
+            put(None)
+
+    future = loop.run_in_executor(_root_pool, job)
+
+    while True:
+        pending = [await chunks.get()]
+        # Coalesce everything already queued into a single notification
+        while not chunks.empty():
+            pending.append(chunks.get_nowait())
+        text = "".join(chunk for chunk in pending if chunk is not None)
+        if text:
+            await ctx.log("info", text, logger_name="stdout")
+        if None in pending:
+            break
+
+    return await future
+
+
+@server.tool(
+    name="root_python",
+    description=(
+        "Execute Python code with PyROOT available in scope. "
+        "Pre-bound names: ROOT, plus np (NumPy) and numba when installed. "
+        "Globals persist across calls: imports, helper functions and ROOT objects defined in one "
+        "call are reused by later calls, so define them once; calls are therefore not isolated."
+    ),
+)
+async def root_python(code: str, ctx: Context):
     """Execute Python code; returns execution result as a dict.
 
     Args:
         code: Python code to execute (ROOT is automatically available)
+        ctx: MCP request context, used to stream stdout while the code runs
     """
-    # Log code execution to stderr (MCP console)
-    print("\n" + "=" * 60, file=sys.stderr)
-    print("EXECUTING PYTHON CODE:", file=sys.stderr)
-    for i, line in enumerate(code.split("\n"), 1):
-        print(f"{i:3d} | {line}", file=sys.stderr)
-    print("=" * 60, file=sys.stderr)
-
-    # Run blocking executor in thread pool to avoid blocking the event loop
-    loop = asyncio.get_running_loop()
-    result = await loop.run_in_executor(None, executor.run_python, code)
+    # Log code execution to the MCP console
+    _log_code("EXECUTING PYTHON CODE", code)
 
-    # Log execution result
-    if result.get("ok"):
-        print("✓ EXECUTION SUCCESS", file=sys.stderr)
-    else:
-        print("❌ EXECUTION FAILED", file=sys.stderr)
-        print(f"Error: {result.get('error')}", file=sys.stderr)
-        print(f"Type: {result.get('error_type')}", file=sys.stderr)
+    # Run blocking executor on the ROOT worker thread to avoid blocking the event loop
+    result = await _run_streaming(ctx, RootExecutor.run_python, code)
 
-    if result.get("stdout"):
-        print(f"STDOUT:\n{result.get('stdout')}", file=sys.stderr)
-    if result.get("stderr"):
-        print(f"STDERR:\n{result.get('stderr')}", file=sys.stderr)
-    print("", file=sys.stderr)
+    # Log execution result
+    _log_result(result)
 
     return result
 
 
 @server.tool(name="root_cpp", description="Execute C++ code via ROOT's cling interpreter.")
-async def root_cpp(code: str):
+async def root_cpp(code: str, ctx: Context):
     """Execute C++/cling code; returns execution result as a dict.
 
     Args:
         code: C++ code to execute via ROOT.gInterpreter
+        ctx: MCP request context, used to stream stdout while the code runs
     """
-    # Log code execution to stderr (MCP console)
-    print("\n" + "=" * 60, file=sys.stderr)
-    print("EXECUTING C++ CODE:", file=sys.stderr)
-    for i, line in enumerate(code.split("\n"), 1):
-        print(f"{i:3d} | {line}", file=sys.stderr)
-    print("=" * 60, file=sys.stderr)
-
-    # Run blocking executor in thread pool to avoid blocking the event loop
-    loop = asyncio.get_running_loop()
-    result = await loop.run_in_executor(None, executor.run_cpp, code)
+    # Log code execution to the MCP console
+    _log_code("EXECUTING C++ CODE", code)
 
-    # Log execution result
-    if result.get("ok"):
-        print("✓ EXECUTION SUCCESS", file=sys.stderr)
-    else:
-        print("❌ EXECUTION FAILED", file=sys.stderr)
-        print(f"Error: {result.get('error')}", file=sys.stderr)
-        print(f"Type: {result.get('error_type')}", file=sys.stderr)
+    # Run blocking executor on the ROOT worker thread to avoid blocking the event loop
+    result = await _run_streaming(ctx, RootExecutor.run_cpp, code)
 
-    if result.get("stdout"):
-        print(f"STDOUT:\n{result.get('stdout')}", file=sys.stderr)
-    if result.get("stderr"):
-        print(f"STDERR:\n{result.get('stderr')}", file=sys.stderr)
-    print("", file=sys.stderr)
+    # Log execution result
+    _log_result(result)
 
     return result
 
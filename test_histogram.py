@@ -24,13 +24,15 @@ async def test_histogram():
             histogram_code = """
 import ROOT
 import time
+import numpy as np
 
 # Create a histogram
 h = ROOT.TH1F("h", "Gaussian Distribution", 100, -5, 5)
 
-# Fill with random gaussian
-for _ in range(10000):
-    h.Fill(ROOT.gRandom.Gaus(0, 1))
+# Fill with random gaussian in one vectorized call
+arr = np.random.default_rng().normal(0.0, 1.0, size=10000).astype(np.float64)
+w = np.ones_like(arr)
+h.FillN(arr.size, arr, w)
 
 # Create canvas and draw
 c = ROOT.TCanvas("c", "Test Canvas", 800, 600)